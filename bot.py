@@ -1,23 +1,34 @@
-import os, re, sqlite3
+import os, sqlite3, threading
 import discord
 from discord.ext import commands
 from dotenv import load_dotenv
 from datetime import datetime
-import time
-from collections import defaultdict
+import time, asyncio
+from contextlib import contextmanager
+from functools import lru_cache
 
 # ------------------ config ------------------
 load_dotenv()
 TOKEN = os.getenv("DISCORD_TOKEN")
 PREFIX = os.getenv("COMMAND_PREFIX", "!")
 DB_PATH = "fp.sqlite"
-_unauth_attempts = defaultdict(lambda: [0, 0.0])
+_unauth_attempts = {}  # user_id -> [window_index, count]
+_unauth_checks = 0
 _MAX_ATTEMPTS = 3
 _WINDOW_SECONDS = 60
+_SWEEP_EVERY = 100  # drop stale _unauth_attempts entries every N failed checks
+_FPALL_CONCURRENCY = 10  # parallel role edits in !fpall
+_WARNCHECK_MAX_LINES = 25  # warnings listed by !warncheck
+_DISCORD_MAX_CHARS = 2000  # message content limit
 
 # ------------------ storage ------------------
-def db():
-    con = sqlite3.connect(DB_PATH)
+def _open_db():
+    """Open the shared connection once, tune it for WAL and create the FP table."""
+    con = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    con.execute("PRAGMA temp_store=MEMORY")
+    con.execute("PRAGMA cache_size=-64000")
     con.execute("""
         CREATE TABLE IF NOT EXISTS user_fp(
             user_id INTEGER PRIMARY KEY,
@@ -26,18 +37,45 @@ def db():
     """)
     return con
 
+# One connection for the whole process (autocommit mode). Helpers run in worker threads
+# (see run_db), so every statement goes through _db_lock.
+_CONN = _open_db()
+_db_lock = threading.Lock()
+
+def db():
+    return _CONN
+
+@contextmanager
+def transaction():
+    """Run several writes on the shared connection as one IMMEDIATE transaction."""
+    with _db_lock:
+        _CONN.execute("BEGIN IMMEDIATE")
+        try:
+            yield _CONN
+        except BaseException:
+            _CONN.execute("ROLLBACK")
+            raise
+        _CONN.execute("COMMIT")
+
+async def run_db(func, *args):
+    """Run a blocking *_sync storage helper in a worker thread, off the event loop."""
+    return await asyncio.to_thread(func, *args)
+
 # ------------------ warning schema upgrade ------------------
 def ensure_warning_schema():
-    """Make sure the warnings table exists and has at least id/user_id; we'll migrate next."""
+    """Make sure the warnings table and its per-user index exist. Run after the migration."""
     con = db()
-    con.execute("""
-        CREATE TABLE IF NOT EXISTS user_warnings(
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL
-        )
-    """)
-    con.commit()
-    con.close()
+    with _db_lock:
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS user_warnings(
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                reason TEXT NOT NULL,
+                date TEXT NOT NULL
+            )
+        """)
+        # Every warning query filters on user_id; newest-first for remove_last_warning
+        con.execute("CREATE INDEX IF NOT EXISTS idx_uw_user ON user_warnings(user_id, id DESC)")
 
 def migrate_user_warnings_table():
     """
@@ -49,102 +87,318 @@ def migrate_user_warnings_table():
     cols = {row[1] for row in cur.fetchall()}
 
     if "warnings" not in cols:
-        con.close()
         return
 
     today = datetime.utcnow().strftime("%Y-%m-%d")
 
-    # Create a brand-new table with the correct schema
-    con.execute("""
-        CREATE TABLE IF NOT EXISTS _uw_new(
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            reason   TEXT NOT NULL,
-            date     TEXT NOT NULL
-        )
-    """)
-
-    if {"reason", "date"}.issubset(cols):
-        # Mixed schema already had reason/date—just copy rows, ignore 'warnings'
+    with transaction() as con:
+        # Create a brand-new table with the correct schema
         con.execute("""
-            INSERT INTO _uw_new (user_id, reason, date)
-            SELECT user_id,
-                   COALESCE(reason, 'Warning administered'),
-                   COALESCE(date, ?)
-            FROM user_warnings
-        """, (today,))
-    else:
-        # Very old schema: only user_id + warnings count. Expand counts into history rows.
-        cur2 = con.execute("SELECT user_id, warnings FROM user_warnings")
-        for user_id, count in cur2.fetchall():
-            count = int(count or 0)
-            for _ in range(count):
-                con.execute(
-                    "INSERT INTO _uw_new (user_id, reason, date) VALUES (?, ?, ?)",
-                    (user_id, "Migrated from legacy count", today)
-                )
-
-    # Replace old table
-    con.execute("DROP TABLE user_warnings")
-    con.execute("ALTER TABLE _uw_new RENAME TO user_warnings")
-    con.commit()
-    con.close()
+            CREATE TABLE IF NOT EXISTS _uw_new(
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                reason   TEXT NOT NULL,
+                date     TEXT NOT NULL
+            )
+        """)
+
+        if {"reason", "date"}.issubset(cols):
+            # Mixed schema already had reason/date—just copy rows, ignore 'warnings'
+            con.execute("""
+                INSERT INTO _uw_new (user_id, reason, date)
+                SELECT user_id,
+                       COALESCE(reason, 'Warning administered'),
+                       COALESCE(date, ?)
+                FROM user_warnings
+            """, (today,))
+        else:
+            # Very old schema: only user_id + warnings count. Expand counts into history rows.
+            cur2 = con.execute("SELECT user_id, warnings FROM user_warnings")
+            rows = []
+            for user_id, count in cur2.fetchall():
+                count = int(count or 0)
+                rows.extend((user_id, "Migrated from legacy count", today) for _ in range(count))
+            con.executemany(
+                "INSERT INTO _uw_new (user_id, reason, date) VALUES (?, ?, ?)",
+                rows
+            )
+
+        # Replace old table
+        con.execute("DROP TABLE user_warnings")
+        con.execute("ALTER TABLE _uw_new RENAME TO user_warnings")
 
 # ------------------ FP functions ------------------
-def get_fp(user_id: int) -> int:
+_FP_MIN, _FP_MAX = -2**63, 2**63 - 1  # SQLite INTEGER is a signed 64-bit value
+
+def check_fp_range(value: int) -> None:
+    if not _FP_MIN <= value <= _FP_MAX:
+        raise commands.BadArgument(f"FP must be between {_FP_MIN} and {_FP_MAX}.")
+
+def _get_fp_sync(user_id: int) -> int:
     con = db()
-    cur = con.execute("SELECT fp FROM user_fp WHERE user_id=?", (user_id,))
-    row = cur.fetchone()
-    con.close()
+    with _db_lock:
+        cur = con.execute("SELECT fp FROM user_fp WHERE user_id=?", (user_id,))
+        row = cur.fetchone()
     return row[0] if row else 0
 
-def set_fp(user_id: int, value: int) -> None:
+def _write_fp_sync(values: dict) -> None:
+    """UPSERT {user_id: fp} in one transaction."""
+    with transaction() as con:
+        con.executemany("INSERT INTO user_fp(user_id, fp) VALUES(?, ?) "
+                        "ON CONFLICT(user_id) DO UPDATE SET fp=excluded.fp",
+                        values.items())
+
+def _add_fp_sync(user_id: int, delta: int) -> int:
+    """Add delta to a user's FP (missing row counts as 0) in one UPSERT. Returns the new FP."""
     con = db()
-    con.execute("INSERT INTO user_fp(user_id, fp) VALUES(?, ?) "
-                "ON CONFLICT(user_id) DO UPDATE SET fp=excluded.fp",
-                (user_id, value))
-    con.commit()
-    con.close()
+    with _db_lock:
+        # SQLite turns an overflowing integer sum into a REAL; the WHERE skips the
+        # update instead, which leaves RETURNING with no row
+        cur = con.execute("INSERT INTO user_fp(user_id, fp) VALUES(?, ?) "
+                          "ON CONFLICT(user_id) DO UPDATE SET fp=fp + excluded.fp "
+                          "WHERE typeof(fp + excluded.fp) = 'integer' "
+                          "RETURNING fp",
+                          (user_id, delta))
+        row = cur.fetchone()
+    if row is None:
+        raise commands.BadArgument(f"FP must be between {_FP_MIN} and {_FP_MAX}.")
+    return row[0]
+
+_SQL_VAR_CHUNK = 500  # stay well under SQLite's bound-parameter limit
+
+def _add_fp_bulk_sync(user_ids: list, delta: int) -> dict:
+    """Add delta to every user's FP in a single transaction. Returns {user_id: new_fp}."""
+    current = {}
+    with transaction() as con:
+        for i in range(0, len(user_ids), _SQL_VAR_CHUNK):
+            chunk = user_ids[i:i + _SQL_VAR_CHUNK]
+            marks = ",".join("?" * len(chunk))
+            cur = con.execute(f"SELECT user_id, fp FROM user_fp WHERE user_id IN ({marks})", chunk)
+            current.update(cur.fetchall())
+
+        new_map = {uid: current.get(uid, 0) + delta for uid in user_ids}
+        con.executemany("INSERT INTO user_fp(user_id, fp) VALUES(?, ?) "
+                        "ON CONFLICT(user_id) DO UPDATE SET fp=excluded.fp",
+                        new_map.items())
+    return new_map
+
+def _top_fp_sync(limit: int) -> list:
+    con = db()
+    with _db_lock:
+        cur = con.execute("""
+            SELECT user_id, fp
+            FROM user_fp
+            ORDER BY fp DESC, user_id ASC
+            LIMIT ?
+        """, (limit,))
+        return cur.fetchall()
+
+# Write-behind buffer: set_fp only records the value here and fp_flush_loop() writes
+# everything out in one transaction every _FP_FLUSH_SECONDS, so repeated changes to
+# the same user coalesce into one write. Reads check the buffer before the DB.
+_fp_dirty = {}  # user_id -> fp not yet on disk
+_fp_flush_lock = asyncio.Lock()
+_FP_FLUSH_SECONDS = 0.5
+
+async def _flush_fp_locked() -> None:
+    if not _fp_dirty:
+        return
+    # Anything out of range can never be written; drop it so it can't wedge every flush
+    for uid in [uid for uid, value in _fp_dirty.items() if not _FP_MIN <= value <= _FP_MAX]:
+        print(f"Dropping unwritable FP {_fp_dirty.pop(uid)} for user {uid}")
+    pending = dict(_fp_dirty)
+    await run_db(_write_fp_sync, pending)
+    # Keep anything that changed again while we were writing
+    for uid, value in pending.items():
+        if _fp_dirty.get(uid) == value:
+            del _fp_dirty[uid]
+
+async def flush_fp() -> None:
+    async with _fp_flush_lock:
+        await _flush_fp_locked()
+
+async def fp_flush_loop() -> None:
+    while True:
+        await asyncio.sleep(_FP_FLUSH_SECONDS)
+        try:
+            await flush_fp()
+        except Exception as e:
+            # Entries stay buffered and are retried on the next tick; never let the task die
+            print(f"FP flush failed: {e!r}")
+
+async def get_fp(user_id: int) -> int:
+    if user_id in _fp_dirty:
+        return _fp_dirty[user_id]
+    return await run_db(_get_fp_sync, user_id)
+
+async def set_fp(user_id: int, value: int) -> None:
+    check_fp_range(value)
+    _fp_dirty[user_id] = value
+
+async def add_fp(user_id: int, delta: int) -> int:
+    check_fp_range(delta)
+    # A buffered value is newer than the DB row, so adjust it in place instead
+    if user_id in _fp_dirty:
+        new = _fp_dirty[user_id] + delta
+        check_fp_range(new)
+        _fp_dirty[user_id] = new
+        return new
+    return await run_db(_add_fp_sync, user_id, delta)
+
+async def add_fp_bulk(user_ids: list, delta: int) -> dict:
+    # Bulk read-modify-write happens in the DB, so pending values must land first
+    async with _fp_flush_lock:
+        await _flush_fp_locked()
+        return await run_db(_add_fp_bulk_sync, user_ids, delta)
+
+async def top_fp(limit: int = 5) -> list:
+    await flush_fp()
+    return await run_db(_top_fp_sync, limit)
 
 # ------------------ role helpers ------------------
-fp_role_pattern = re.compile(r"^\d+\s*FP$", re.IGNORECASE)
-
 def is_fp_role(role: discord.Role) -> bool:
-    return fp_role_pattern.match(role.name or "") is not None
+    # "<digits>[spaces]FP", any case -- i.e. ^\d+\s*FP$ without the regex engine
+    name = role.name or ""
+    if len(name) < 3 or name[-2:].upper() != "FP":
+        return False
+    return name[:-2].rstrip().isdecimal()
 
-async def sync_member_fp_role(member: discord.Member, new_fp: int):
-    roles_to_remove = [r for r in member.roles if is_fp_role(r)]
-    if roles_to_remove:
-        try:
-            await member.remove_roles(*roles_to_remove, reason="FP update")
-        except discord.Forbidden:
-            pass
+@lru_cache(maxsize=4096)
+def fp_role_name(value: int) -> str:
+    """Role name for an FP value, e.g. 109 -> "109 FP". Cached so bulk syncs reuse the strings."""
+    return f"{value} FP"
+
+def fp_roles_by_name(guild: discord.Guild) -> dict:
+    """Map role name -> role for every "<n> FP" role, for repeated lookups.
+
+    Keyed on the name suffix rather than is_fp_role so negative roles like "-2 FP"
+    resolve too, and first match wins on duplicate names, same as discord.utils.get.
+    """
+    role_by_name = {}
+    for r in guild.roles:
+        if r.name.endswith(" FP"):
+            role_by_name.setdefault(r.name, r)
+    return role_by_name
+
+async def sync_member_fp_role(member: discord.Member, new_fp: int, role_by_name: dict = None):
+    role_name = fp_role_name(new_fp)
+    if role_by_name is not None:
+        target_role = role_by_name.get(role_name)
+    else:
+        target_role = discord.utils.get(member.guild.roles, name=role_name)
+
+    # FP roles other than the target (the target may not pass is_fp_role, e.g. "-2 FP")
+    stale_roles = [r for r in member.roles if is_fp_role(r) and r != target_role]
 
-    role_name = f"{new_fp} FP"
-    target_role = discord.utils.get(member.guild.roles, name=role_name)
+    # Already holding the right FP role and no other: nothing to send
+    if target_role and target_role in member.roles and not stale_roles:
+        return True
+
+    # Drop every FP role and add the target in one Modify Guild Member request
+    # (@everyone is implicit and must not be sent back)
+    new_roles = [r for r in member.roles
+                 if not r.is_default() and not is_fp_role(r) and r != target_role]
     if target_role:
+        new_roles.append(target_role)
+
+    if stale_roles or target_role:
         try:
-            await member.add_roles(target_role, reason=f"Set to {new_fp} FP")
+            await member.edit(roles=new_roles, reason=f"Set to {role_name}")
         except discord.Forbidden:
             pass
-        return True
-    return False
+    return target_role is not None
+
+# guild_id -> (guild, non-bot members); dropped on join/leave. Member objects are
+# updated in place by discord.py within a session, so role/nick changes don't need to
+# invalidate it. A re-identify rebuilds every Guild/Member object, so an entry whose
+# Guild isn't the live one is stale and gets rebuilt.
+_humans_cache = {}
+
+def human_members(guild: discord.Guild) -> list:
+    """Non-bot members of the guild, cached once the member list is fully chunked."""
+    cached = _humans_cache.get(guild.id)
+    if cached is not None and cached[0] is guild:
+        return cached[1]
+
+    humans = [m for m in guild.members if not m.bot]
+    if guild.chunked:
+        _humans_cache[guild.id] = (guild, humans)
+    else:
+        _humans_cache.pop(guild.id, None)
+    return humans
+
+async def display_names(guild: discord.Guild, user_ids: list) -> dict:
+    """Map user_id -> display name, fetching members missing from the cache in one gateway query."""
+    names = {}
+    missing = []
+    for uid in user_ids:
+        member = guild.get_member(uid)
+        if member:
+            names[uid] = member.display_name
+        else:
+            missing.append(uid)
+
+    if missing:
+        try:
+            fetched = await guild.query_members(user_ids=missing, cache=True)
+        except (asyncio.TimeoutError, discord.ClientException):
+            fetched = []
+        for member in fetched:
+            names[member.id] = member.display_name
+
+    return names
 
 # ------------------ bot setup ------------------
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
-bot = commands.Bot(command_prefix=PREFIX, intents=intents)
 
-# Make sure warnings table is ready before using
-ensure_warning_schema()
+class FPBot(commands.Bot):
+    _fp_flusher = None
+
+    async def setup_hook(self):
+        self._fp_flusher = asyncio.create_task(fp_flush_loop())
+
+    async def close(self):
+        # Stop the write-behind task and persist whatever it hadn't written yet
+        try:
+            if self._fp_flusher:
+                self._fp_flusher.cancel()
+            await flush_fp()
+        finally:
+            await super().close()
+
+bot = FPBot(command_prefix=PREFIX, intents=intents)
+
+# Make sure warnings table is ready before using (migrate first: it rebuilds the table)
 migrate_user_warnings_table()
+ensure_warning_schema()
 
 @bot.event
 async def on_ready():
     print(f"Logged in as {bot.user} (id={bot.user.id})")
     print("Ready to manage FP roles!")
 
+def record_unauth_attempt(user_id: int, now: float) -> int:
+    """Count a failed permission check in the current fixed window. Returns the count so far."""
+    global _unauth_checks
+    wi = int(now // _WINDOW_SECONDS)
+
+    cur = _unauth_attempts.get(user_id)
+    if cur is None or cur[0] != wi:
+        cur = [wi, 0]
+        _unauth_attempts[user_id] = cur
+    cur[1] += 1
+
+    # Periodically forget users whose window has passed, so the dict stays bounded
+    _unauth_checks += 1
+    if _unauth_checks >= _SWEEP_EVERY:
+        _unauth_checks = 0
+        for uid in [uid for uid, (w, _) in _unauth_attempts.items() if w != wi]:
+            del _unauth_attempts[uid]
+
+    return cur[1]
+
 def manage_roles_only():
     async def predicate(ctx):
         perms = ctx.author.guild_permissions
@@ -152,19 +406,11 @@ def manage_roles_only():
 
         # If they do have permission, reset their counter and allow
         if has_perm:
-            _unauth_attempts[ctx.author.id] = [0, 0.0]
+            _unauth_attempts.pop(ctx.author.id, None)
             return True
 
         # No permission: update attempt counter within time window
-        now = time.time()
-        count, last_ts = _unauth_attempts[ctx.author.id]
-
-        # Reset if last attempt was outside the window
-        if now - last_ts > _WINDOW_SECONDS:
-            count = 0
-
-        count += 1
-        _unauth_attempts[ctx.author.id] = [count, now]
+        count = record_unauth_attempt(ctx.author.id, time.time())
 
         if count >= _MAX_ATTEMPTS:
             # Escalated message on 3rd+ attempt within the window
@@ -180,19 +426,17 @@ def manage_roles_only():
 @bot.command(name="fp", help="Adjust FP: !fp @user +5 or !fp @user -3")
 @manage_roles_only()
 async def fp(ctx, member: discord.Member, delta: int):
-    current = get_fp(member.id)
-    new = current + delta
-    set_fp(member.id, new)
+    new = await add_fp(member.id, delta)
     existed = await sync_member_fp_role(member, new)
-    note = "" if existed else f" *(role `{new} FP` not found)*"
+    note = "" if existed else f" *(role `{fp_role_name(new)}` not found)*"
     await ctx.reply(f"{member.mention} is now **{new} FP**.{note}", mention_author=False)
 
 @bot.command(name="fpset", help="Set FP exactly: !fpset @user 109")
 @manage_roles_only()
 async def fpset(ctx, member: discord.Member, value: int):
-    set_fp(member.id, value)
+    await set_fp(member.id, value)
     existed = await sync_member_fp_role(member, value)
-    note = "" if existed else f" *(role `{value} FP` not found)*"
+    note = "" if existed else f" *(role `{fp_role_name(value)}` not found)*"
     await ctx.reply(f"{member.mention} set to **{value} FP**.{note}", mention_author=False)
 
 from typing import Optional
@@ -201,41 +445,45 @@ from typing import Optional
 async def fpcheck(ctx, member: Optional[discord.Member] = None):
     # Default to the caller if no user mentioned
     member = member or ctx.author
-    await ctx.reply(f"{member.mention} has **{get_fp(member.id)} FP**.", mention_author=False)
+    value = await get_fp(member.id)
+    await ctx.reply(f"{member.mention} has **{value} FP**.", mention_author=False)
 
 @bot.command(name="fprolesync", help="Resync a member's FP -> role")
 @manage_roles_only()
 async def fprolesync(ctx, member: discord.Member):
-    value = get_fp(member.id)
+    value = await get_fp(member.id)
     existed = await sync_member_fp_role(member, value)
-    note = "" if existed else f" *(role `{value} FP` not found)*"
+    note = "" if existed else f" *(role `{fp_role_name(value)}` not found)*"
     await ctx.reply(f"Synchronized {member.mention} to **{value} FP**.{note}", mention_author=False)
 
 @bot.command(name="fpall", help="(Admin) Adjust FP for ALL members: !fpall +5 or !fpall -2")
 @manage_roles_only()
 async def fpall(ctx, delta: int):
     updated = 0
-    skipped_bots = 0
     failed_syncs = 0
 
-    # Iterate current guild members
-    for member in ctx.guild.members:
-        if member.bot:
-            skipped_bots += 1
-            continue
-        try:
-            current = get_fp(member.id)
-            new = current + delta
-            set_fp(member.id, new)
-
-            # Try to sync role (if the matching role exists)
-            existed = await sync_member_fp_role(member, new)
-            if not existed:
-                failed_syncs += 1
-            updated += 1
-        except Exception:
+    # Current guild members, minus bots
+    members = human_members(ctx.guild)
+
+    # Write every member's new FP in one transaction
+    new_map = await add_fp_bulk([m.id for m in members], delta)
+
+    # Try to sync roles (if the matching role exists), a few members at a time
+    role_by_name = fp_roles_by_name(ctx.guild)
+    sem = asyncio.Semaphore(_FPALL_CONCURRENCY)
+
+    async def _one(member):
+        async with sem:
+            return await sync_member_fp_role(member, new_map[member.id], role_by_name)
+
+    results = await asyncio.gather(*(_one(m) for m in members), return_exceptions=True)
+    for existed in results:
+        if isinstance(existed, Exception):
             # If anything weird happens with one member, just continue
             continue
+        if not existed:
+            failed_syncs += 1
+        updated += 1
 
     # Summary
     msg = f"Applied **{delta:+d} FP** to **{updated}** members."
@@ -246,93 +494,125 @@ async def fpall(ctx, delta: int):
 
 @bot.command(name="fptop", help="Show the top 5 users with the highest FP")
 async def fptop(ctx):
-    con = db()
-    cur = con.execute("""
-        SELECT user_id, fp
-        FROM user_fp
-        ORDER BY fp DESC, user_id ASC
-        LIMIT 5
-    """)
-    rows = cur.fetchall()
-    con.close()
+    rows = await top_fp(5)
 
     if not rows:
         await ctx.send("No FP data found.")
         return
 
+    names = await display_names(ctx.guild, [user_id for user_id, _ in rows])
+
     lines = []
     for i, (user_id, fp) in enumerate(rows, start=1):
-        member = ctx.guild.get_member(user_id)
-        name = member.display_name if member else f"User ID {user_id}"
+        name = names.get(user_id, f"User ID {user_id}")
         lines.append(f"**{i}.** {name} — **{fp} FP**")
 
     await ctx.send("__**Top FP Havers**__\n" + "\n".join(lines))
 
 # ------------------ warning system ------------------
-def add_warning(user_id: int, reason: str):
+_today_cache = (-1, "")  # (UTC day number, "YYYY-MM-DD"); swapped as one tuple so threads see a pair
+
+def today_str() -> str:
+    """Today's UTC date as YYYY-MM-DD, formatted once per day."""
+    global _today_cache
+    now = int(time.time())
+    day = now // 86400
+    if day != _today_cache[0]:
+        _today_cache = (day, time.strftime("%Y-%m-%d", time.gmtime(now)))
+    return _today_cache[1]
+
+def _add_warning_sync(user_id: int, reason: str):
     con = db()
-    con.execute("""
-        CREATE TABLE IF NOT EXISTS user_warnings(
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            reason TEXT NOT NULL,
-            date TEXT NOT NULL
-        )
-    """)
-    con.execute("""
-        INSERT INTO user_warnings (user_id, reason, date)
-        VALUES (?, ?, ?)
-    """, (user_id, reason, datetime.utcnow().strftime("%Y-%m-%d")))
-    con.commit()
-    con.close()
+    with _db_lock:
+        con.execute("""
+            INSERT INTO user_warnings (user_id, reason, date)
+            VALUES (?, ?, ?)
+        """, (user_id, reason, today_str()))
 
-def get_all_warnings(user_id: int):
+def _get_all_warnings_sync(user_id: int, limit: int = -1, offset: int = 0):
+    """(reason, date) rows oldest first; limit/offset page through them (-1 = no limit)."""
     con = db()
-    con.execute("""
-        CREATE TABLE IF NOT EXISTS user_warnings(
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            reason TEXT NOT NULL,
-            date TEXT NOT NULL
-        )
-    """)
-    cur = con.execute("""
-        SELECT reason, date FROM user_warnings
-        WHERE user_id=?
-        ORDER BY id ASC
-    """, (user_id,))
-    rows = cur.fetchall()
-    con.close()
+    with _db_lock:
+        cur = con.execute("""
+            SELECT reason, date FROM user_warnings
+            WHERE user_id=?
+            ORDER BY id ASC
+            LIMIT ? OFFSET ?
+        """, (user_id, limit, offset))
+        rows = cur.fetchall()
     return rows
 
-def clear_warnings(user_id: int) -> int:
+def _count_warnings_sync(user_id: int) -> int:
+    con = db()
+    with _db_lock:
+        cur = con.execute("SELECT COUNT(*) FROM user_warnings WHERE user_id=?", (user_id,))
+        return cur.fetchone()[0]
+
+def _clear_warnings_sync(user_id: int) -> int:
     """Delete all warnings for a user. Returns number of rows deleted."""
     con = db()
-    cur = con.execute("SELECT COUNT(*) FROM user_warnings WHERE user_id=?", (user_id,))
-    (count,) = cur.fetchone()
-    con.execute("DELETE FROM user_warnings WHERE user_id=?", (user_id,))
-    con.commit()
-    con.close()
-    return count
-
-def remove_last_warning(user_id: int) -> bool:
+    with _db_lock:
+        cur = con.execute("DELETE FROM user_warnings WHERE user_id=?", (user_id,))
+    return cur.rowcount
+
+def _remove_last_warning_sync(user_id: int) -> bool:
     """Delete the most recent warning (highest id) for a user. Returns True if one was deleted."""
     con = db()
-    cur = con.execute("""
-        SELECT id FROM user_warnings
-        WHERE user_id=?
-        ORDER BY id DESC
-        LIMIT 1
-    """, (user_id,))
-    row = cur.fetchone()
-    if not row:
-        con.close()
-        return False
-    (last_id,) = row
-    con.execute("DELETE FROM user_warnings WHERE id=?", (last_id,))
-    con.commit()
-    con.close()
-    return True
+    with _db_lock:
+        cur = con.execute("""
+            DELETE FROM user_warnings
+            WHERE id = (
+                SELECT id FROM user_warnings
+                WHERE user_id=?
+                ORDER BY id DESC
+                LIMIT 1
+            )
+            RETURNING 1
+        """, (user_id,))
+        row = cur.fetchone()
+    return row is not None
+
+def _top_warnings_sync(limit: int) -> list:
+    con = db()
+    with _db_lock:
+        cur = con.execute("""
+            SELECT user_id, COUNT(*) AS total
+            FROM user_warnings
+            GROUP BY user_id
+            ORDER BY total DESC, user_id ASC
+            LIMIT ?
+        """, (limit,))
+        return cur.fetchall()
+
+def _remove_member_data_sync(user_id: int) -> None:
+    """Forget a member entirely: their FP and their warning history, in one transaction."""
+    with transaction() as con:
+        con.execute("DELETE FROM user_fp WHERE user_id = ?", (user_id,))
+        con.execute("DELETE FROM user_warnings WHERE user_id = ?", (user_id,))
+
+async def add_warning(user_id: int, reason: str):
+    await run_db(_add_warning_sync, user_id, reason)
+
+async def get_all_warnings(user_id: int, limit: int = -1, offset: int = 0):
+    return await run_db(_get_all_warnings_sync, user_id, limit, offset)
+
+async def count_warnings(user_id: int) -> int:
+    return await run_db(_count_warnings_sync, user_id)
+
+async def clear_warnings(user_id: int) -> int:
+    return await run_db(_clear_warnings_sync, user_id)
+
+async def remove_last_warning(user_id: int) -> bool:
+    return await run_db(_remove_last_warning_sync, user_id)
+
+async def top_warnings(limit: int = 5) -> list:
+    return await run_db(_top_warnings_sync, limit)
+
+async def remove_member_data(user_id: int) -> None:
+    # Drop any buffered FP and wait out an in-flight flush so it can't re-insert the row
+    _fp_dirty.pop(user_id, None)
+    async with _fp_flush_lock:
+        await run_db(_remove_member_data_sync, user_id)
 
 @bot.command(name="warn", help="Warn a user with optional reason: !warn @user [reason]")
 @manage_roles_only()
@@ -340,8 +620,8 @@ async def warn(ctx, member: discord.Member, *, reason: str = None):
     if not reason:
         reason = "Warning administered"
 
-    add_warning(member.id, reason)
-    total_warnings = len(get_all_warnings(member.id))
+    await add_warning(member.id, reason)
+    total_warnings = await count_warnings(member.id)
 
     GENERAL_CHANNEL_ID = 1115086270780145728  # Replace with your general channel ID
     general_channel = bot.get_channel(GENERAL_CHANNEL_ID)
@@ -367,21 +647,33 @@ async def warncheck(ctx, member: Optional[discord.Member] = None):
     # Default to the caller if no user mentioned
     member = member or ctx.author
 
-    warnings = get_all_warnings(member.id)
-    total = len(warnings)
+    total = await count_warnings(member.id)
 
     if total == 0:
         await ctx.send(f"{member.mention} has no warnings.")
         return
 
-    warning_list = "\n".join([f"- [{date}] {reason}" for reason, date in warnings])
-    message = f"{member.mention} has been warned {total} times:\n{warning_list}"
+    # Only fetch the most recent ones, then drop the oldest until the reply fits
+    offset = max(total - _WARNCHECK_MAX_LINES, 0)
+    warnings = await get_all_warnings(member.id, _WARNCHECK_MAX_LINES, offset)
+
+    lines = [f"- [{date}] {reason}" for reason, date in warnings]
+    while True:
+        shown = f" (last {len(lines)} shown)" if len(lines) < total else ""
+        message = f"{member.mention} has been warned {total} times{shown}:\n" + "\n".join(lines)
+        if len(message) <= _DISCORD_MAX_CHARS or len(lines) == 1:
+            break
+        lines.pop(0)
+
+    # A single reason can still be too long on its own
+    if len(message) > _DISCORD_MAX_CHARS:
+        message = message[:_DISCORD_MAX_CHARS - 1] + "…"
     await ctx.send(message)
 
 @bot.command(name="warnclear", help="(Admin) Clear ALL warnings: !warnclear @user")
 @manage_roles_only()
 async def warnclear(ctx, member: discord.Member):
-    removed = clear_warnings(member.id)
+    removed = await clear_warnings(member.id)
     if removed == 0:
         await ctx.reply(f"{member.mention} has no warnings to clear.", mention_author=False)
     else:
@@ -390,13 +682,13 @@ async def warnclear(ctx, member: discord.Member):
 @bot.command(name="warnsub", help="(Admin) Remove most recent warning: !warnsub @user")
 @manage_roles_only()
 async def warnsub(ctx, member: discord.Member):
-    ok = remove_last_warning(member.id)
+    ok = await remove_last_warning(member.id)
     if not ok:
         await ctx.reply(f"{member.mention} has no warnings to remove.", mention_author=False)
         return
 
     # show updated count for confirmation
-    total = len(get_all_warnings(member.id))
+    total = await count_warnings(member.id)
     await ctx.reply(
         f"Removed most recent warning for {member.mention}. Now at **{total}** warnings.",
         mention_author=False
@@ -404,35 +696,24 @@ async def warnsub(ctx, member: discord.Member):
 
 @bot.command(name="warntop", help="Show the top 5 users with the most warnings")
 async def warntop(ctx):
-    con = db()
-    cur = con.execute("""
-        SELECT user_id, COUNT(*) AS total
-        FROM user_warnings
-        GROUP BY user_id
-        ORDER BY total DESC, user_id ASC
-        LIMIT 5
-    """)
-    rows = cur.fetchall()
-    con.close()
+    rows = await top_warnings(5)
 
     if not rows:
         await ctx.send("No warnings recorded.")
         return
 
+    names = await display_names(ctx.guild, [user_id for user_id, _ in rows])
+
     lines = []
     for i, (user_id, total) in enumerate(rows, start=1):
-        member = ctx.guild.get_member(user_id)
-        name = member.display_name if member else f"User ID {user_id}"
+        name = names.get(user_id, f"User ID {user_id}")
         lines.append(f"**{i}.** {name} — **{total} warnings**")
 
     await ctx.send("__**Top Warning Havers**__\n" + "\n".join(lines))
 
-@bot.command(name="com", help="Show available commands (context-aware help)")
-async def com(ctx):
-    # Detect admin/mod (same rule as your manage_roles_only check)
-    is_admin = ctx.author.guild_permissions.manage_roles or ctx.author.guild_permissions.administrator
-    prefix = getattr(ctx, "prefix", PREFIX)
-
+@lru_cache(maxsize=4)
+def _render_com(prefix: str, is_admin: bool) -> str:
+    """Build the !com help text. Only depends on (prefix, is_admin), so it's rendered once per pair."""
     # Public commands
     public_cmds = [
         (f"{prefix}fpcheck @user", "Show a member's FP"),
@@ -462,19 +743,28 @@ async def com(ctx):
         title = "__**Commands**__"
         lines = [f"- `{c}` — {d}" for c, d in public_cmds]
 
-    await ctx.send(f"{title}\n" + "\n".join(lines))
+    return f"{title}\n" + "\n".join(lines)
+
+@bot.command(name="com", help="Show available commands (context-aware help)")
+async def com(ctx):
+    # Detect admin/mod (same rule as your manage_roles_only check)
+    is_admin = ctx.author.guild_permissions.manage_roles or ctx.author.guild_permissions.administrator
+    prefix = getattr(ctx, "prefix", PREFIX)
+
+    await ctx.send(_render_com(prefix, bool(is_admin)))
 
 # ------------------ run bot ------------------
 
+@bot.event
+async def on_member_join(member):
+    _humans_cache.pop(member.guild.id, None)
+
 @bot.event
 async def on_member_remove(member):
-    # Remove their FP
-    con = db()
-    con.execute("DELETE FROM user_fp WHERE user_id = ?", (member.id,))
-    # Remove their warnings
-    con.execute("DELETE FROM user_warnings WHERE user_id = ?", (member.id,))
-    con.commit()
-    con.close()
+    _humans_cache.pop(member.guild.id, None)
+
+    # Remove their FP and warnings in one transaction (one commit)
+    await remove_member_data(member.id)
 
     print(f"Removed FP and warnings for {member} ({member.id}) because they left or were kicked.")
 